@@ -1,19 +1,27 @@
 import discord
 from discord.ext import commands
 import asyncio
+import concurrent.futures
 import logging
 import os
+import time
+import traceback
 from dotenv import load_dotenv
 import yt_dlp
-import ffmpeg
-from collections import deque
+from collections import OrderedDict, deque
+from itertools import islice
 
 # Load opus library with better error handling for Railway/hosting platforms
 def load_opus_library():
     """Load opus library with multiple fallback options"""
     import ctypes.util
     
+    if discord.opus.is_loaded():
+        return True
+    
+    # find_library is what discord.py itself uses, so it usually succeeds on the first try
     opus_paths = [
+        ctypes.util.find_library('opus'),
         'opus',
         'libopus.so.0',
         'libopus.so',
@@ -22,7 +30,6 @@ def load_opus_library():
         '/usr/lib/x86_64-linux-gnu/libopus.so.0',
         '/usr/lib/libopus.so.0',
         '/usr/local/lib/libopus.so.0',
-        ctypes.util.find_library('opus')
     ]
     
     for opus_path in opus_paths:
@@ -36,14 +43,8 @@ def load_opus_library():
             print(f"Failed to load opus from {opus_path}: {e}")
             continue
     
-    # Final attempt without specifying path
-    try:
-        discord.opus.load_opus()
-        print("Successfully loaded opus (default)")
-        return True
-    except Exception as e:
-        print(f"Failed to load opus library: {e}")
-        return False
+    print("Failed to load opus library")
+    return False
 
 # Load opus
 opus_loaded = load_opus_library()
@@ -70,8 +71,6 @@ intents.message_content = False  # Not needed for slash commands
 # YouTube DL configuration
 ytdl_format_options = {
     'format': 'bestaudio/best',
-    'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
-    'restrictfilenames': True,
     'noplaylist': True,
     'nocheckcertificate': True,
     'ignoreerrors': False,
@@ -82,15 +81,69 @@ ytdl_format_options = {
     'source_address': '0.0.0.0',
 }
 
+# Lightweight options for text searches: only resolve the watch URL of the first result
+ytdl_search_options = {
+    'extract_flat': 'in_playlist',
+    'skip_download': True,
+    'quiet': True,
+    'no_warnings': True,
+    'default_search': 'ytsearch1',
+}
+
+# PCM sources are scaled by PCMVolumeTransformer, so FFmpeg applies no volume filter
 ffmpeg_options = {
+    'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
+    'options': '-vn'
+}
+
+# Opus sources bypass PCMVolumeTransformer, so the default volume is applied by FFmpeg
+ffmpeg_opus_options = {
     'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
     'options': '-vn -filter:a "volume=0.5"'
 }
 
 ytdl = yt_dlp.YoutubeDL(ytdl_format_options)
+ytdl_search = yt_dlp.YoutubeDL(ytdl_search_options)
+
+# Dedicated threads for blocking yt-dlp calls, kept apart from the default executor
+_ytdl_pool = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix='ytdl')
 
-# Music queue storage
-music_queues = {}
+# Resolved YouTube stream URLs expire after a few hours; re-resolve well before that
+STREAM_URL_MAX_AGE = 3600
+
+# Per-guild queue and playback state
+guild_players = {}
+
+# Upper bound on queued songs per guild, so /play spam cannot grow memory without limit
+MAX_QUEUE_LENGTH = 500
+
+# Recent /play lookups by normalized query, so repeated requests skip yt-dlp entirely
+EXTRACT_CACHE_SIZE = 128
+_extract_cache = OrderedDict()  # query -> (data, resolved_at), least recently used first
+
+def has_fresh_stream_url(song):
+    """Check whether a queue entry carries a stream URL that is still safe to play"""
+    return bool(song.get('stream_url')) and time.time() - song.get('resolved_at', 0) < STREAM_URL_MAX_AGE
+
+def get_cached_extraction(key):
+    """Return the cached (data, resolved_at) for a query while its stream URL is fresh"""
+    cached = _extract_cache.get(key)
+    if cached is None:
+        return None
+    if time.time() - cached[1] >= STREAM_URL_MAX_AGE:
+        del _extract_cache[key]
+        return None
+    _extract_cache.move_to_end(key)
+    return cached
+
+def cache_extraction(key, data, resolved_at):
+    """Remember the fields /play needs from an extraction, evicting the oldest entries"""
+    # The full info dict holds every format; keep only what ends up in the queue entry
+    fields = {k: data[k] for k in ('title', 'duration', 'webpage_url', 'url') if k in data}
+    _extract_cache[key] = (fields, resolved_at)
+    _extract_cache.move_to_end(key)
+    while len(_extract_cache) > EXTRACT_CACHE_SIZE:
+        _extract_cache.popitem(last=False)
 
 class YTDLSource(discord.PCMVolumeTransformer):
     def __init__(self, source, *, data, volume=0.5):
@@ -100,15 +153,186 @@ class YTDLSource(discord.PCMVolumeTransformer):
         self.url = data.get('url')
 
     @classmethod
-    async def from_url(cls, url, *, loop=None, stream=False):
-        loop = loop or asyncio.get_event_loop()
-        data = await loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=not stream))
+    def from_data(cls, data, *, volume=0.5):
+        """Create a source from a queue entry that already has a resolved stream URL"""
+        return cls(discord.FFmpegPCMAudio(data['stream_url'], **ffmpeg_options), data=data, volume=volume)
+
+async def resolve_stream_url(song):
+    """Resolve a fresh stream URL for a queue entry"""
+    data = await asyncio.get_running_loop().run_in_executor(_ytdl_pool, ytdl.extract_info, song['url'], False)
+    if 'entries' in data:
+        data = data['entries'][0]
+    song['stream_url'] = data['url']
+    song['resolved_at'] = time.time()
+
+class GuildPlayer:
+    """Queue and playback loop for a single guild"""
+    
+    def __init__(self, guild):
+        self.guild = guild
+        self.queue = deque(maxlen=MAX_QUEUE_LENGTH)
+        self.current = None
+        self.volume = None  # Set by /volume; None means the default Opus path
+        self.next_event = asyncio.Event()
+        self.lock = asyncio.Lock()  # Serializes song transitions with /play
+        self.task = None
+        self.prefetch_task = None
+    
+    def is_running(self):
+        """Whether the playback loop is active, including between songs"""
+        return self.task is not None and not self.task.done()
+    
+    def start(self):
+        """Start the playback loop unless it is already running"""
+        if not self.is_running():
+            self.task = asyncio.create_task(self._player_loop())
+    
+    def schedule_prefetch(self):
+        """Run prefetch_next in the background, replacing any prefetch still in flight"""
+        # The loop only holds weak references to tasks, so keep this one on the player
+        if self.prefetch_task and not self.prefetch_task.done():
+            self.prefetch_task.cancel()
+        self.prefetch_task = asyncio.create_task(self.prefetch_next())
+    
+    def clear(self):
+        """Empty the queue and kill any FFmpeg process spawned ahead of time"""
+        if self.prefetch_task and not self.prefetch_task.done():
+            self.prefetch_task.cancel()
+        for song in self.queue:
+            source = song.pop('source', None)
+            if source:
+                source.cleanup()
+        self.queue.clear()
+    
+    def create_audio_source(self, song):
+        """Create the audio source for a queue entry with a resolved stream URL"""
+        if song.get('use_volume_transform'):
+            # /volume was used, so decode to PCM and scale it in Python
+            return YTDLSource.from_data(song, volume=self.volume)
+        # FFmpeg encodes Opus itself, so discord.py sends the packets as-is
+        return discord.FFmpegOpusAudio(song['stream_url'], **ffmpeg_opus_options)
+    
+    async def _player_loop(self):
+        """Play songs until the queue runs dry, one at a time"""
+        source = None  # Popped source not yet owned by the voice client
+        try:
+            while self.queue:
+                async with self.lock:
+                    next_song = await self._get_next()
+                    if next_song is None:
+                        break
+                    
+                    song, source = next_song
+                    # Left set when _play returns False or raises, so finally cleans it up
+                    if not self._play(song, source):
+                        break
+                    source = None
+                
+                # Woken by _after_playing once FFmpeg finishes or the song is skipped
+                await self.next_event.wait()
+                self.next_event.clear()
+                logger.info(f"Finished playing: {song['title']}")
+        except Exception as e:
+            logger.error(f"Error in player loop for {self.guild.name}: {e}")
+            logger.error(f"Full traceback: {traceback.format_exc()}")
+        finally:
+            # Also reached when remove_player cancels us; don't leave an FFmpeg process behind
+            if source:
+                source.cleanup()
+            self.current = None
+    
+    async def _get_next(self):
+        """Pop songs until one yields an audio source; None once the queue is empty"""
+        while self.queue:
+            song = self.queue.popleft()
+            logger.debug("Playing next song: %s - %s", song['title'], song['url'])
+            
+            try:
+                logger.debug("Creating audio source for URL: %s", song['url'])
+                if 'source' in song:
+                    # FFmpeg was already started by the prefetch
+                    source = song.pop('source')
+                else:
+                    # Reuse the stream URL resolved by the play command or the prefetch when possible
+                    if not has_fresh_stream_url(song):
+                        await resolve_stream_url(song)
+                    source = self.create_audio_source(song)
+                logger.debug("Audio source created successfully with title: %s", song['title'])
+            except Exception as e:
+                logger.error(f"Error creating audio source: {e}")
+                logger.error(f"Full traceback: {traceback.format_exc()}")
+                # Try the next song if this one fails
+                continue
+            
+            return song, source
         
-        if 'entries' in data:
-            data = data['entries'][0]
+        logger.debug("No songs in queue")
+        return None
+    
+    def _play(self, song, source):
+        """Hand a source to the voice client; returns False if playback cannot start"""
+        voice_client = self.guild.voice_client
+        if not voice_client:
+            logger.error("No voice client available")
+            return False
+        
+        # Check if opus is loaded before playing
+        if not discord.opus.is_loaded():
+            logger.error("Opus not loaded, cannot play audio")
+            return False
+        
+        voice_client.play(source, after=self._after_playing)
+        self.current = song
+        logger.info(f"Now playing: {song['title']} in {self.guild.name}")
+        self.schedule_prefetch()
+        logger.debug("Voice client is_playing: %s, is_paused: %s", voice_client.is_playing(), voice_client.is_paused())
+        logger.debug("Opus loaded: %s", discord.opus.is_loaded())
+        return True
+    
+    def _after_playing(self, error):
+        # Runs on discord.py's audio thread; only wake the player loop from here
+        if error:
+            logger.error(f"Player error: {error}")
+        bot.loop.call_soon_threadsafe(self.next_event.set)
+    
+    async def prefetch_next(self):
+        """Prepare the next song's audio source while the current song is playing"""
+        if not self.queue:
+            return
+        
+        # Peek only; the player loop is still the one that pops
+        song = self.queue[0]
+        if 'source' in song:
+            return
         
-        filename = data['url'] if stream else ytdl.prepare_filename(data)
-        return cls(discord.FFmpegPCMAudio(filename, **ffmpeg_options), data=data)
+        try:
+            if not has_fresh_stream_url(song):
+                logger.debug("Prefetching stream URL for: %s", song['title'])
+                await resolve_stream_url(song)
+                
+                # The song may have been skipped or cleared while resolving
+                if not self.queue or self.queue[0] is not song:
+                    return
+            
+            # Spawn FFmpeg now so its startup overlaps the current song instead of the gap after it
+            song['source'] = self.create_audio_source(song)
+        except Exception as e:
+            logger.error(f"Error prefetching {song['title']}: {e}")
+
+def get_player(guild):
+    """Get the GuildPlayer for a guild, creating it on first use"""
+    if guild.id not in guild_players:
+        guild_players[guild.id] = GuildPlayer(guild)
+    return guild_players[guild.id]
+
+def remove_player(guild_id):
+    """Drop a guild's GuildPlayer along with anything still queued"""
+    player = guild_players.pop(guild_id, None)
+    if player:
+        player.clear()
+        # Stop a loop that already popped a song from playing it into a later session
+        if player.is_running():
+            player.task.cancel()
 
 class DiscordBot(commands.Bot):
     def __init__(self):
@@ -148,8 +372,14 @@ class DiscordBot(commands.Bot):
         logger.info(f"Left guild: {guild.name} (ID: {guild.id})")
         
         # Clean up music queue for this guild
-        if guild.id in music_queues:
-            del music_queues[guild.id]
+        remove_player(guild.id)
+    
+    async def on_voice_state_update(self, member, before, after):
+        """Called when a member's voice state changes"""
+        # Drop the queue when the bot itself leaves voice, e.g. after being kicked
+        if member.id == self.user.id and before.channel and after.channel is None:
+            logger.info(f"Disconnected from voice in guild: {member.guild.name}")
+            remove_player(member.guild.id)
 
 # Create bot instance
 bot = DiscordBot()
@@ -181,75 +411,107 @@ async def play(interaction: discord.Interaction, query: str):
         
         voice_channel = interaction.user.voice.channel
         guild_id = interaction.guild.id
-        logger.info(f"Voice channel: {voice_channel}, Guild ID: {guild_id}")
-        
-        # Initialize queue for this guild if not exists
-        if guild_id not in music_queues:
-            music_queues[guild_id] = deque()
+        logger.debug("Voice channel: %s, Guild ID: %s", voice_channel, guild_id)
         
         # Respond immediately to avoid timeout
         await interaction.response.send_message(f"🔍 Mencari lagu: **{query}**...")
         
         # Try to extract video info
         try:
-            # If query is not a URL, search for it on YouTube
-            if not query.startswith(('http://', 'https://', 'www.')):
-                search_query = f"ytsearch:{query}"
-                logger.info(f"Searching YouTube for: {search_query}")
-            else:
-                search_query = query
-                logger.info(f"Using direct URL: {search_query}")
-            
-            data = await asyncio.get_event_loop().run_in_executor(None, lambda: ytdl.extract_info(search_query, download=False))
-            logger.info(f"YouTube data extracted successfully")
+            is_url = query.startswith(('http://', 'https://', 'www.'))
+            # Video IDs are case-sensitive, so only text searches are lowercased
+            cache_key = query.strip() if is_url else query.strip().lower()
             
-            if 'entries' in data:
-                data = data['entries'][0]
-                logger.info(f"Using first entry from search results")
+            cached = get_cached_extraction(cache_key)
+            if cached:
+                data, resolved_at = cached
+                logger.debug("Using cached extraction for: %s", query)
+            else:
+                # If query is not a URL, search for it on YouTube
+                if not is_url:
+                    logger.debug("Searching YouTube for: %s", query)
+                    results = await asyncio.get_running_loop().run_in_executor(_ytdl_pool, ytdl_search.extract_info, f"ytsearch1:{query}", False)
+                    if not results.get('entries'):
+                        await interaction.edit_original_response(content=f"❌ Tidak ada hasil untuk '{query}'.")
+                        return
+                    search_query = results['entries'][0]['url']
+                    logger.debug("Found watch URL: %s", search_query)
+                else:
+                    search_query = query
+                    logger.debug("Using direct URL: %s", search_query)
+                
+                data = await asyncio.get_running_loop().run_in_executor(_ytdl_pool, ytdl.extract_info, search_query, False)
+                resolved_at = time.time()
+                logger.debug("YouTube data extracted successfully")
+                
+                if 'entries' in data:
+                    data = data['entries'][0]
+                    logger.debug("Using first entry from search results")
+                
+                cache_extraction(cache_key, data, resolved_at)
             
             title = data.get('title', 'Unknown')
             duration = data.get('duration', 0)
             actual_url = data.get('webpage_url', data.get('url', query))
-            logger.info(f"Song info - Title: {title}, Duration: {duration}, URL: {actual_url}")
+            logger.debug("Song info - Title: %s, Duration: %s, URL: %s", title, duration, actual_url)
+            
+            # Look the player up only now: /stop may have discarded the old one during extraction
+            player = get_player(interaction.guild)
+            
+            # A full deque would silently drop the song that is up next
+            if len(player.queue) >= MAX_QUEUE_LENGTH:
+                await interaction.edit_original_response(content=f"❌ Queue penuh (maksimal {MAX_QUEUE_LENGTH} lagu).")
+                return
             
             # Add to queue
-            music_queues[guild_id].append({
+            player.queue.append({
                 'url': actual_url,
                 'title': title,
                 'duration': duration,
-                'requester': interaction.user.mention
+                'requester': interaction.user.mention,
+                'stream_url': data.get('url'),
+                'resolved_at': resolved_at,
+                'use_volume_transform': player.volume is not None
             })
-            logger.info(f"Added to queue. Queue length: {len(music_queues[guild_id])}")
+            logger.debug("Added to queue. Queue length: %d", len(player.queue))
             
-            # Connect to voice channel if not already connected
-            if not interaction.guild.voice_client:
-                logger.info(f"Connecting to voice channel: {voice_channel}")
-                voice_client = await voice_channel.connect()
-                logger.info(f"Successfully connected to voice channel")
-            else:
-                voice_client = interaction.guild.voice_client
-                if voice_client.channel != voice_channel:
-                    logger.info(f"Moving to voice channel: {voice_channel}")
-                    await voice_client.move_to(voice_channel)
+            # Concurrent /play calls would otherwise both try to connect
+            async with player.lock:
+                # Connect to voice channel if not already connected
+                if not interaction.guild.voice_client:
+                    logger.debug("Connecting to voice channel: %s", voice_channel)
+                    voice_client = await voice_channel.connect()
+                    logger.info(f"Successfully connected to voice channel")
+                else:
+                    voice_client = interaction.guild.voice_client
+                    if voice_client.channel != voice_channel:
+                        logger.info(f"Moving to voice channel: {voice_channel}")
+                        await voice_client.move_to(voice_channel)
+                
+                # Ask the player loop, not the voice client: it may be between songs or not
+                # have picked up its first song yet, and then nothing is playing either way
+                starting = not player.is_running()
+                if starting:
+                    logger.info("Starting to play music...")
+                    player.start()
+                else:
+                    logger.info("Music already playing, added to queue")
+                    if len(player.queue) == 1:
+                        # This song is up next; get it ready while the current one plays
+                        player.schedule_prefetch()
             
-            # If nothing is playing, start playing
-            if not voice_client.is_playing():
-                logger.info("Starting to play music...")
-                await play_next_song(interaction.guild)
+            if starting:
                 await interaction.edit_original_response(content=f"🎵 Sekarang memutar: **{title}**")
             else:
-                logger.info("Music already playing, added to queue")
                 await interaction.edit_original_response(content=f"🎵 Ditambahkan ke queue: **{title}**")
                 
         except Exception as e:
             logger.error(f"Error processing YouTube query '{query}': {e}")
-            import traceback
             logger.error(f"Full traceback: {traceback.format_exc()}")
             await interaction.edit_original_response(content=f"❌ Tidak bisa memproses '{query}'. Error: {str(e)[:200]}...")
             
     except Exception as e:
         logger.error(f"Error in play command: {e}")
-        import traceback
         logger.error(f"Full traceback: {traceback.format_exc()}")
         try:
             await interaction.followup.send("Terjadi kesalahan saat memproses command!", ephemeral=True)
@@ -264,9 +526,8 @@ async def stop(interaction: discord.Interaction):
         guild_id = interaction.guild.id
         
         if voice_client:
-            # Clear queue
-            if guild_id in music_queues:
-                music_queues[guild_id].clear()
+            # Clear queue first so the player loop has nothing to start while we disconnect
+            remove_player(guild_id)
             
             # Stop playing and disconnect
             voice_client.stop()
@@ -301,17 +562,16 @@ async def queue(interaction: discord.Interaction):
     try:
         guild_id = interaction.guild.id
         
-        if guild_id not in music_queues or not music_queues[guild_id]:
+        if guild_id not in guild_players or not guild_players[guild_id].queue:
             await interaction.response.send_message("Queue kosong.", ephemeral=True)
             return
         
-        queue_list = []
-        for i, song in enumerate(list(music_queues[guild_id])[:10], 1):  # Show first 10 songs
-            queue_list.append(f"{i}. **{song['title']}** - {song['requester']}")
-        
-        queue_text = "\n".join(queue_list)
-        if len(music_queues[guild_id]) > 10:
-            queue_text += f"\n... dan {len(music_queues[guild_id]) - 10} lagu lainnya"
+        song_queue = guild_players[guild_id].queue
+        n = len(song_queue)
+        rows = [f"{i}. **{song['title']}** - {song['requester']}" for i, song in enumerate(islice(song_queue, 10), 1)]  # Show first 10 songs
+        if n > 10:
+            rows.append(f"... dan {n - 10} lagu lainnya")
+        queue_text = "\n".join(rows)
         
         embed = discord.Embed(title="🎵 Music Queue", description=queue_text, color=0x0099ff)
         await interaction.response.send_message(embed=embed)
@@ -320,68 +580,6 @@ async def queue(interaction: discord.Interaction):
         logger.error(f"Error in queue command: {e}")
         await interaction.response.send_message("Terjadi kesalahan saat menampilkan queue!", ephemeral=True)
 
-async def play_next_song(guild):
-    """Play the next song in the queue"""
-    try:
-        logger.info(f"play_next_song called for guild: {guild.name}")
-        
-        if guild.id not in music_queues or not music_queues[guild.id]:
-            logger.info("No songs in queue")
-            return
-        
-        voice_client = guild.voice_client
-        if not voice_client:
-            logger.error("No voice client available")
-            return
-        
-        # Get next song from queue
-        next_song = music_queues[guild.id].popleft()
-        logger.info(f"Playing next song: {next_song['title']} - {next_song['url']}")
-        
-        # Create audio source
-        try:
-            logger.info(f"Creating audio source for URL: {next_song['url']}")
-            player = await YTDLSource.from_url(next_song['url'], loop=bot.loop, stream=True)
-            logger.info(f"Audio source created successfully with title: {player.title}")
-        except Exception as e:
-            logger.error(f"Error creating audio source: {e}")
-            import traceback
-            logger.error(f"Full traceback: {traceback.format_exc()}")
-            # Try to play next song if current fails
-            if music_queues[guild.id]:
-                await play_next_song(guild)
-            return
-        
-        # Play the song
-        def after_playing(error):
-            if error:
-                logger.error(f"Player error: {error}")
-            else:
-                logger.info(f"Finished playing: {next_song['title']}")
-            
-            # Play next song in queue
-            coro = play_next_song(guild)
-            fut = asyncio.run_coroutine_threadsafe(coro, bot.loop)
-            try:
-                fut.result()
-            except Exception as e:
-                logger.error(f"Error playing next song: {e}")
-        
-        # Check if opus is loaded before playing
-        if not discord.opus.is_loaded():
-            logger.error("Opus not loaded, cannot play audio")
-            return
-        
-        voice_client.play(player, after=after_playing)
-        logger.info(f"Now playing: {next_song['title']} in {guild.name}")
-        logger.info(f"Voice client is_playing: {voice_client.is_playing()}, is_paused: {voice_client.is_paused()}")
-        logger.info(f"Opus loaded: {discord.opus.is_loaded()}")
-        
-    except Exception as e:
-        logger.error(f"Error in play_next_song: {e}")
-        import traceback
-        logger.error(f"Full traceback: {traceback.format_exc()}")
-
 @bot.tree.command(name="nowplaying", description="Lihat lagu yang sedang diputar")
 async def nowplaying(interaction: discord.Interaction):
     """Show currently playing song"""
@@ -389,10 +587,11 @@ async def nowplaying(interaction: discord.Interaction):
         voice_client = interaction.guild.voice_client
         
         if voice_client and voice_client.is_playing():
-            # Get current song info from voice client source
-            source = voice_client.source
-            if hasattr(source, 'title') and source.title:
-                await interaction.response.send_message(f"🎵 Sedang memutar: **{source.title}**")
+            # Opus sources carry no metadata, so look up the queue entry instead
+            player = guild_players.get(interaction.guild.id)
+            song = player.current if player else None
+            if song and song.get('title'):
+                await interaction.response.send_message(f"🎵 Sedang memutar: **{song['title']}**")
             else:
                 await interaction.response.send_message("🎵 Sedang memutar musik...")
         else:
@@ -424,8 +623,21 @@ async def volume(interaction: discord.Interaction, volume: int):
         
         voice_client = interaction.guild.voice_client
         if voice_client and voice_client.source:
-            voice_client.source.volume = volume / 100
-            await interaction.response.send_message(f"🔊 Volume diatur ke {volume}%")
+            player = get_player(interaction.guild)
+            player.volume = volume / 100
+            
+            # Queued songs now need the PCM path; drop Opus sources spawned ahead of time
+            for song in player.queue:
+                song['use_volume_transform'] = True
+                source = song.pop('source', None)
+                if source:
+                    source.cleanup()
+            
+            if isinstance(voice_client.source, discord.PCMVolumeTransformer):
+                voice_client.source.volume = volume / 100
+                await interaction.response.send_message(f"🔊 Volume diatur ke {volume}%")
+            else:
+                await interaction.response.send_message(f"🔊 Volume diatur ke {volume}% (berlaku mulai lagu berikutnya)")
         else:
             await interaction.response.send_message("Tidak ada musik yang sedang diputar.", ephemeral=True)
     except Exception as e:
@@ -475,6 +687,7 @@ async def main():
     finally:
         if not bot.is_closed():
             await bot.close()
+        _ytdl_pool.shutdown(wait=False, cancel_futures=True)
 
 if __name__ == "__main__":
     try: